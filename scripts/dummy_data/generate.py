@@ -4,15 +4,22 @@ import subprocess
 import re
 import argparse
 import itertools
+import hashlib
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Optional, TypeAlias, Union, Tuple, cast, Literal, TypedDict, get_args
+from typing import Iterator, List, Dict, Optional, TypeAlias, Union, Tuple, cast, Literal, TypedDict, get_args
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 GOLDEN_DIR = 'golden'
 INCLUDES_DIR = 'includes'
 PROMPTS_DIR = 'prompts'
 TARGET_DIR = 'cache'
+# llm outputs keyed by a hash of the prompt that produced them
+LLM_CACHE_DIR = '.llm_cache'
+LLM_COMMAND = ['llm', '-m', 'claude-3.5-sonnet']
 LATEST_LINK = '_latest'
 INFO_DIR = '_info'
 WILDCARD = '*'
@@ -21,6 +28,11 @@ SPLIT_COMMAND = 'split'
 JOIN_COMMAND = 'join'
 MODIFIER_DELIMITER = '|'
 
+# Matches ${name}, ${name|command} and ${name|command:arg}, ignoring whitespace inside the braces
+PLACEHOLDER_RE = re.compile(r"\${\s*([a-zA-Z0-9_|:]+)\s*}")
+IDENTIFIER_RE = re.compile(r"^[_a-zA-Z][a-zA-Z0-9_]*$")
+SANITIZE_RE = re.compile(r'[^a-zA-Z0-9._-]')
+
 OverridesDict: TypeAlias = Dict[str, str]
 PlaceholderValue : TypeAlias = Union[str, Dict[str, str]]
 
@@ -41,6 +53,18 @@ class ExecutionContext:
     timestamp: str
     # an array of names, which must be 'golden', 'cache', 'includes', or 'prompts'
     ignore: IgnoreDict
+    # how many llm commands may run at once
+    parallel: int
+    # whether an identical prompt may reuse a previous llm output
+    llm_cache: bool
+    # fully compiled value for each raw placeholder (e.g. "files|split")
+    # resolved so far. A placeholder that several prompts depend on is only
+    # fetched and compiled once per run.
+    compiled: Dict[str, PlaceholderValue] = field(default_factory=dict)
+    # value each placeholder name was fetched as, before any modifiers
+    fetched: Dict[str, PlaceholderValue] = field(default_factory=dict)
+    # result of compile_prompt for each (name, raw_prompt) compiled so far
+    compiled_prompts: Dict[Tuple[str, str], PlaceholderValue] = field(default_factory=dict)
 
 def pin(placeholder : str) -> None:
     # print the word and the word with the word "golden" appended to it
@@ -64,13 +88,19 @@ def pin(placeholder : str) -> None:
 def clear_golden(name : str) -> None:
     # Generate the output directory path
     output_dir = f"./{GOLDEN_DIR}/{name}"
-    if os.path.exists(output_dir):
+    # Just try each removal rather than checking for existence first
+    try:
+        files = os.listdir(output_dir)
         print(f"Clearing golden subdirectory for {name}")
-        for file in os.listdir(output_dir):
+        for file in files:
             os.remove(f"{output_dir}/{file}")
-    if os.path.exists(f"./{GOLDEN_DIR}/{name}.txt"):
-        print(f"Clearing golden file for {name}")
+    except FileNotFoundError:
+        pass
+    try:
         os.remove(f"./{GOLDEN_DIR}/{name}.txt")
+        print(f"Cleared golden file for {name}")
+    except FileNotFoundError:
+        pass
 
 def write_golden(name : str, subName : Optional[str], contents : str) -> None:
     # Generate the output directory path
@@ -91,12 +121,13 @@ def write_golden(name : str, subName : Optional[str], contents : str) -> None:
     print(f"Pinned {name}:{subName} to goldens")
 
 # returns all the variations, as well as the keys that varied. as well as a map from value to shortname
-def value_variations(input: Dict[str, PlaceholderValue]) -> Tuple[List[Dict[str, str]], List[str], Dict[str, str]]:
-    variations: List[Dict[str, str]] = []
+# The variations are generated lazily, so a big grid of multi values is never
+# held in memory all at once.
+def value_variations(input: Dict[str, PlaceholderValue]) -> Tuple[Iterator[Dict[str, str]], List[str], Dict[str, str]]:
     nested_keys = [k for k, v in input.items() if isinstance(v, dict)]
     
     if not nested_keys:
-        return (cast(List[Dict[str, str]], [input.copy()]), [], {})
+        return (iter([cast(Dict[str, str], input.copy())]), [], {})
 
     # Group keys by their base name (before '|'). We'll treat all of them in the
     # same group as the same and they'll co-vary.
@@ -115,20 +146,25 @@ def value_variations(input: Dict[str, PlaceholderValue]) -> Tuple[List[Dict[str,
             combined_values.update(cast(Dict[str, str], input[k]))
         nested_values.append([(base_key, vk, vv) for vk, vv in combined_values.items()])
 
-    short_names: Dict[str, str] = {}
+    # Built in one pass over the nested values, rather than re-recording every
+    # pair for every combination they show up in.
+    short_names: Dict[str, str] = {vv: vk for values in nested_values for _, vk, vv in values}
+
+    # The non-nested values are the same in every variation
+    base = {k: v for k, v in input.items() if not isinstance(v, dict)}
 
-    for combination in itertools.product(*nested_values):
-        variation = {k: v for k, v in input.items() if not isinstance(v, dict)}
-        for base_key, nested_key, nested_value in combination:
-            for full_key in key_groups[base_key]:
-                variation[full_key] = nested_value
-            short_names[nested_value] = nested_key
-        variations.append(variation)
+    def variations() -> Iterator[Dict[str, str]]:
+        for combination in itertools.product(*nested_values):
+            variation = base.copy()
+            for base_key, _, nested_value in combination:
+                for full_key in key_groups[base_key]:
+                    variation[full_key] = nested_value
+            yield variation
 
     #keep only the first key of each group so we don't get duplicate names
     deduped_nested_keys = [v[0] for v in key_groups.values()]
     
-    return (variations, deduped_nested_keys, short_names)
+    return (variations(), deduped_nested_keys, short_names)
         
 def name_for_variation(variation : Dict[str, str], nested_keys : List[str], short_names : Dict[str, str]) -> str:
     result : List[str] = []
@@ -138,8 +174,10 @@ def name_for_variation(variation : Dict[str, str], nested_keys : List[str], shor
         short = short_names.get(v, v)
         str_v = sanitize_string(f"{short}")
         if len(str_v) > 32:
-            #create a md5 hash of the string and render it in a positive hex number
-            str_v = f"{hash(v) & 0xFFFFFFFF:08x}"
+            # Use a short stable hash of the value instead. hash() is salted
+            # per process, so it would name the same variation differently on
+            # every run.
+            str_v = hashlib.blake2b(v.encode(), digest_size=4).hexdigest()
         result.append(str_v)
     return "_".join(result)
 
@@ -150,31 +188,75 @@ def fetch_most_recent_target(name: str) -> Optional[PlaceholderValue]:
     return fetch_folder(most_recent_target_dir(name), name, True)
 
 def fetch_folder(folder : str, name: str, folder_is_specific : bool = False) -> Optional[PlaceholderValue]:
+    files = index_folder(folder)
     # check the folder exists
-    if not os.path.exists(folder):
+    if files is None:
         return None
 
     # Looks for the file in ${folder}/ with the basename ${name} (any extension) and returns the contents
-    files = [f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
-    for file in files:
-        if os.path.splitext(file)[0] == name:
-            with open(f"{folder}/{file}", 'r') as file:
-                return file.read()
+    if name in files:
+        return read_file(files[name])
 
     filename = os.path.join(folder, name) if not folder_is_specific else folder
 
-    # if the filename is a directory:
-    if os.path.isdir(filename):
-        # return the contents of each file in the directory. By skipping directories, we naturally skip INFO_DIR
-        files = [f for f in os.listdir(filename) if os.path.isfile(os.path.join(filename, f))]
-        result : Dict[str, str] = {}
-        for file in files:
-            with open(f"{filename}/{file}", 'r') as file_obj:
-                # remove the extension from the filename
-                result[os.path.splitext(file)[0]] = file_obj.read()
-        return result
-    
-    return None
+    # if the filename is a directory, return the contents of each file in the
+    # directory. By skipping directories, we naturally skip INFO_DIR
+    files = index_folder(filename)
+    if files is None:
+        return None
+    return {basename: read_file(path) for basename, path in files.items()}
+
+# Directory listings and file contents are cached for the lifetime of a run,
+# since compile_prompt asks for the same folders and placeholders over and
+# over. The golden, includes and prompts folders are only ever listed once;
+# when a prompt writes new output, forget_target drops just that target.
+folder_indexes : Dict[str, Optional[Dict[str, str]]] = {}
+file_contents : Dict[str, str] = {}
+
+def index_folder(folder : str) -> Optional[Dict[str, str]]:
+    # Maps the basename (without extension) of each file in the folder to its
+    # path, or None if the folder doesn't exist.
+    if folder in folder_indexes:
+        return folder_indexes[folder]
+    result : Optional[Dict[str, str]] = {}
+    try:
+        # scandir's entries know whether they're files without an extra stat() per entry.
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    result.setdefault(os.path.splitext(entry.name)[0], entry.path)
+    except (FileNotFoundError, NotADirectoryError):
+        result = None
+    folder_indexes[folder] = result
+    return result
+
+def read_file(path : str) -> str:
+    if path not in file_contents:
+        # Read with os.read rather than a buffered text file object. For a
+        # regular file the first read, sized from fstat, gets everything and
+        # the second just confirms EOF; anything else (e.g. a pipe) keeps
+        # reading until EOF.
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            chunks : List[bytes] = []
+            size = max(os.fstat(fd).st_size, 1)
+            while chunk := os.read(fd, size):
+                chunks.append(chunk)
+        finally:
+            os.close(fd)
+        text = b''.join(chunks).decode()
+        # Match text mode's universal newlines
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        file_contents[path] = text
+    return file_contents[path]
+
+def forget_target(name : str) -> None:
+    # Drops any listings and contents cached from the target folder for name
+    prefix = f"./{TARGET_DIR}/{name}/"
+    for cache in (folder_indexes, file_contents):
+        for key in [k for k in cache if k.startswith(prefix)]:
+            del cache[key]
 
 def fetch_prompt(name: str, context : ExecutionContext, parent_names: List[str]) -> Optional[PlaceholderValue]:
     # Fetch the raw prompt and compile it
@@ -205,6 +287,13 @@ def should_ignore(folder : IgnoreType, name: str, ignore: IgnoreDict) -> bool:
     return name in l
 
 def fetch_placeholder(name: str, context : ExecutionContext, parent_names: List[str]) -> PlaceholderValue:
+    # A name resolves to the same value for the whole run (e.g. for both
+    # ${files} and ${files|split}), so only look it up once.
+    if name not in context.fetched:
+        context.fetched[name] = lookup_placeholder(name, context, parent_names)
+    return context.fetched[name]
+
+def lookup_placeholder(name: str, context : ExecutionContext, parent_names: List[str]) -> PlaceholderValue:
 
     # Override order:
     # 1. Explicitly provided placeholder_override
@@ -254,8 +343,10 @@ def fetch_placeholder(name: str, context : ExecutionContext, parent_names: List[
 
 def compile_prompt(name: str, raw_prompt: str, context : ExecutionContext, parent_names: List[str]) -> PlaceholderValue:
 
-    # Identify any placeholders in the prompt that match ${name}, ignoring any whitespace in the placeholder
-    placeholders = re.findall(r"\${\s*([a-zA-Z0-9_|:]+)\s*}", raw_prompt)
+    # Identify any placeholders in the prompt that match ${name}, ignoring any
+    # whitespace in the placeholder. The substring test is much cheaper than
+    # the regex, and rules out most prompts with no placeholders at all.
+    placeholders = PLACEHOLDER_RE.findall(raw_prompt) if '${' in raw_prompt else []
 
     if len(placeholders) == 0:
         if len(parent_names) == 0:
@@ -263,6 +354,12 @@ def compile_prompt(name: str, raw_prompt: str, context : ExecutionContext, paren
             print("No placeholders found in the prompt.")
         return raw_prompt
     
+    # The raw prompt is used directly as part of the key; str caches its own
+    # hash, so this is cheaper than digesting it ourselves.
+    cache_key = (name, raw_prompt)
+    if cache_key in context.compiled_prompts:
+        return context.compiled_prompts[cache_key]
+
     print(f"Compiling prompt for {name}...")
 
     # create a dictionary to store the values of the placeholders. we'll key off
@@ -270,8 +367,9 @@ def compile_prompt(name: str, raw_prompt: str, context : ExecutionContext, paren
     # different ways and those should be distinct.
     placeholder_values: Dict[str, PlaceholderValue] = {}
 
-    # Iterate over the placeholders
-    for raw_placeholder in placeholders:
+    # Iterate over the unique placeholders; a placeholder used several times
+    # only needs to be fetched and compiled once.
+    for raw_placeholder in dict.fromkeys(placeholders):
 
         raw_placeholder = raw_placeholder.strip()
 
@@ -283,9 +381,14 @@ def compile_prompt(name: str, raw_prompt: str, context : ExecutionContext, paren
             raise Exception(f"Circular dependency detected: {parent_names} -> {placeholder}")
         
         # check that placeholder matches [a-zA-Z][a-zA-Z0-9_]*
-        if not re.match(r"^[_a-zA-Z][a-zA-Z0-9_]*$", placeholder):
+        if not IDENTIFIER_RE.match(placeholder):
             raise Exception(f"Invalid placeholder name {placeholder}")
 
+        if raw_placeholder in context.compiled:
+            print(f"Using already compiled value for {raw_placeholder}...")
+            placeholder_values[raw_placeholder] = context.compiled[raw_placeholder]
+            continue
+
         multi = False
         join : JoinArgs = ''
 
@@ -322,45 +425,70 @@ def compile_prompt(name: str, raw_prompt: str, context : ExecutionContext, paren
             else:
                 value = "\n".join(value.values())
 
+        # Values without a "${" can't contain placeholders, so there's nothing
+        # to compile. That's most of them (e.g. each line of a split), so skip
+        # the recursive call entirely.
         if isinstance(value, dict):
             result : Dict[str, str] = {}
             for key, val in value.items():
+                if '${' not in val:
+                    result[key] = val
+                    continue
                 temp = compile_prompt(placeholder, val, context, parent_names + [name])
                 if isinstance(temp, dict):
                     # TODO: figure out how to support this case
                     raise Exception(f"Nested multi not supported for {placeholder}")
                 result[key] = temp
             placeholder_values[raw_placeholder] = result
+        elif '${' not in value:
+            placeholder_values[raw_placeholder] = value
         else:
             placeholder_values[raw_placeholder] = compile_prompt(placeholder, value, context, parent_names + [name])
 
+        context.compiled[raw_placeholder] = placeholder_values[raw_placeholder]
+
     result : Dict[str, str] = {}
 
     (variations, nested_keys, short_names) = value_variations(placeholder_values)
 
+    # Tokenize the prompt once. PLACEHOLDER_RE has a single group, so split()
+    # alternates between literal text and raw placeholders (e.g.
+    # "input|split"). Most placeholders have the same value in every
+    # variation, so those are folded into the surrounding text up front; each
+    # multi placeholder gets a slot in segments to fill in per variation.
+    # Values are inserted verbatim, so they aren't rescanned for placeholders.
+    segments : List[str] = []
+    slots : List[Tuple[int, str]] = []
+    text : List[str] = []
+    for i, part in enumerate(PLACEHOLDER_RE.split(raw_prompt)):
+        value = part if i % 2 == 0 else placeholder_values[part]
+        if isinstance(value, dict):
+            segments.append(''.join(text))
+            text = []
+            slots.append((len(segments), part))
+            segments.append('')
+        else:
+            text.append(value)
+    segments.append(''.join(text))
+
     # Iterate over every combination of placeholder values. If there are no
     # multi values, this will run once. If there are multiple multi values with
     # length m and n, this will run m * n times. And so on.
     for variation in variations:
-        # Replace the placeholders with the values
-        prompt = raw_prompt
-        for raw_placeholder, value in variation.items():
-            # we can't do a naive match because the placeholder tag might
-            # include other commands. e.g. the placeholder "input" might need to
-            # match "${input|split}". We also need to support whitespace.
-            pattern = re.compile(rf'\$\{{\s*({re.escape(raw_placeholder).replace("\\ ", "\\s+")})\s*(?::[^}}]*)?\s*\}}')
-            escaped_value = escape_backslashes(value)
-            prompt = pattern.sub(escaped_value, prompt)
+        parts = segments.copy()
+        for index, raw_placeholder in slots:
+            parts[index] = variation[raw_placeholder]
+        prompt = ''.join(parts)
         variation_name = name_for_variation(variation, nested_keys, short_names)
         result[variation_name] = prompt
 
     # if it's a single prompt, return the only value.        
     keys = list(result.keys())
-    if len(keys) == 1:
-        return result[keys[0]]
+    compiled : PlaceholderValue = result[keys[0]] if len(keys) == 1 else result
+    context.compiled_prompts[cache_key] = compiled
 
     # Return the compiled prompt
-    return result
+    return compiled
 
 
 def execute_prompt(name: str, raw_prompt: str, context : ExecutionContext, parent_names: Optional[List[str]] = None) -> None:
@@ -376,6 +504,10 @@ def execute_prompt(name: str, raw_prompt: str, context : ExecutionContext, paren
     # This will also make the output_dir implicitly
     os.makedirs(prompts_dir, exist_ok=True)
 
+    # Ignoring the cache for a prompt means we want fresh output for it, so
+    # don't hand back an old llm output either.
+    reuse_llm_output = context.llm_cache and not should_ignore('cache', name, context.ignore)
+
     # Compile the prompt
     prompt = compile_prompt(name, raw_prompt, context, parent_names)
     
@@ -384,43 +516,112 @@ def execute_prompt(name: str, raw_prompt: str, context : ExecutionContext, paren
         new_prompt[name] = prompt
         prompt = new_prompt
 
-    for variation_name, prompt in prompt.items():
-        try:
-            # TODO: don't double print names in single mode
-            print(f"Running llm command for {name} / {variation_name}...")
-
-            # Pipe the prompt contents to the llm command with the option -m claude-3.5-sonnet
-            output = subprocess.check_output(['llm', '-m', 'claude-3.5-sonnet'], input=prompt, universal_newlines=True)
-
-            prompt_output_file = f"{prompts_dir}/{variation_name}.txt"
-            with open(prompt_output_file, 'w') as file:
-                file.write(prompt)
-
+    # Each llm command mostly waits on the model, so run up to
+    # context.parallel of them at once and save each output as it finishes.
+    failed = False
+    with ThreadPoolExecutor(max_workers=context.parallel) as executor:
+        futures : Dict[Future[None], Tuple[str, bytes]] = {}
+        for variation_name, variation_prompt in prompt.items():
             # Generate the output file path
             output_file = f"{output_dir}/{variation_name}.txt"
+            prompt_bytes = variation_prompt.encode()
+            # TODO: don't double print names in single mode
+            description = f"{name} / {variation_name}"
+            futures[executor.submit(run_llm, prompt_bytes, output_file, reuse_llm_output, description)] = (variation_name, prompt_bytes)
+
+        for future in as_completed(futures):
+            variation_name, prompt_bytes = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                if isinstance(e, subprocess.CalledProcessError):
+                    with print_lock:
+                        print(f"Error running llm command for {name}: {e}")
+                # Whatever went wrong, don't start anything new. The commands
+                # that are already running have to finish before we can exit.
+                executor.shutdown(wait=False, cancel_futures=True)
+                if any(f.running() for f in futures):
+                    with print_lock:
+                        print("Waiting for the llm commands that are already running to finish...")
+                if not isinstance(e, subprocess.CalledProcessError):
+                    raise
+                failed = True
+                break
 
-            # Save the output to the file
-            with open(output_file, 'w') as file:
-                file.write(output)
+            prompt_output_file = f"{prompts_dir}/{variation_name}.txt"
+            with open(prompt_output_file, 'wb') as file:
+                file.write(prompt_bytes)
 
-            print(f"Output saved to {output_file}")
+            with print_lock:
+                print(f"Output saved to {output_dir}/{variation_name}.txt")
 
-        except subprocess.CalledProcessError as e:
-            print(f"Error running llm command for {name}: {e}")
-            sys.exit(1)
+    if failed:
+        sys.exit(1)
 
     # Create the soft link '_latest' pointing to the timestamp directory
     # We wait until here, so that we don't create a pointer to an incomplete run
     latest_link = most_recent_target_dir(name)
-    if os.path.exists(latest_link):
-        os.unlink(latest_link)
-    os.symlink(timestamp, latest_link, target_is_directory=True)
+    try:
+        # If the prompt already ran earlier in this run, it's already pointing at us.
+        unchanged = os.readlink(latest_link) == timestamp
+    except OSError:
+        unchanged = False
+    if not unchanged:
+        # Swap the new link into place atomically so that there's never a
+        # moment without a _latest.
+        temp_link = f"{latest_link}.tmp.{os.getpid()}"
+        try:
+            # Left behind by an earlier run with our pid that died mid-swap
+            os.unlink(temp_link)
+        except FileNotFoundError:
+            pass
+        os.symlink(timestamp, temp_link, target_is_directory=True)
+        os.replace(temp_link, latest_link)
+
+    # Anything read through _latest is now stale, even if it still points at the same directory.
+    forget_target(name)
+
+# run_llm prints from the executor's worker threads. print() writes the
+# message and the newline separately, so anything printed while llm commands
+# are running needs to hold this to keep lines from interleaving.
+print_lock = threading.Lock()
+
+def run_llm(prompt : bytes, output_file : str, reuse_cached : bool, description : str) -> None:
+    # Every llm output is kept in LLM_CACHE_DIR under a hash of the command and
+    # the prompt, so running an identical prompt again can skip the llm
+    # entirely. Including the command means that changing the model or its
+    # flags doesn't hand back another model's output.
+    key = hashlib.blake2b(b'\0'.join(arg.encode() for arg in LLM_COMMAND) + b'\0' + prompt, digest_size=16)
+    cached_file = f"./{LLM_CACHE_DIR}/{key.hexdigest()}.txt"
+
+    if reuse_cached and os.path.exists(cached_file):
+        with print_lock:
+            print(f"Reusing llm output for an identical prompt for {description}...")
+    else:
+        with print_lock:
+            print(f"Running llm command for {description}...")
+        temp_file = f"{cached_file}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            # Pipe the prompt contents to the llm command. Its stdout is the
+            # file itself, so the response goes straight to disk without ever
+            # being buffered here.
+            with open(temp_file, 'wb') as file:
+                subprocess.run(LLM_COMMAND, input=prompt, stdout=file, check=True)
+        except BaseException:
+            # Don't leave a partial output behind, whatever stopped us
+            try:
+                os.unlink(temp_file)
+            except FileNotFoundError:
+                pass
+            raise
+        os.replace(temp_file, cached_file)
+
+    # Copy rather than link, so that editing an output in place can't change
+    # the cached entry.
+    shutil.copyfile(cached_file, output_file)
 
 def sanitize_string(input_string : str) -> str:
-    return re.sub(r'[^a-zA-Z0-9._-]', '_', input_string)
-
-def escape_backslashes(s : str) -> str:
-    return s.replace('\\', '\\\\')
+    return SANITIZE_RE.sub('_', input_string)
 
 def main() -> None:
     parser = argparse.ArgumentParser(description='Process a prompt file.\nBy default, a single prompt is executed. If stdin is provided, then it will execute the template once for each line, piping that line\'s input as the override variable "_input"')
@@ -428,23 +629,25 @@ def main() -> None:
     parser.add_argument('--overrides', nargs='+', action='append', help='Named override placeholders in the format ARG_1 VAL_1 ARG_2 VAL_2')
     parser.add_argument('--ignore', nargs='+', help=f"Ignore specific types of inputs. Types include {get_args(IgnoreType)}. You can also add a ':placeholder_1,placeholder_2' to specify only those placeholders. You can also do multiple named types in front of the colon: 'golden,cache:backstory'. '*' means all of that type. Can also pass 'existing'", )
 
+    parser.add_argument('--parallel', type=int, default=1, help='How many llm commands to run at once when a prompt is in multi-mode')
+
+    parser.add_argument('--no-llm-cache', action='store_true', help='Always run the llm command, even for a prompt whose output is already in the llm cache')
+
     args = parser.parse_args()
 
+    if args.parallel < 1:
+        parser.error('--parallel must be at least 1')
+
     prompt_file = args.prompt_file
     prompt_base_filename = os.path.splitext(os.path.basename(prompt_file))[0]
 
-    overrides : OverridesDict = {}
-
-    if args.overrides:
-        # We'll populate the global placeholder_overrides dictionary with the named arguments
-        for arg_pair in args.overrides:
-            if len(arg_pair) % 2 != 0:
-                print("Invalid named arguments. Each argument should have a corresponding value.")
-                sys.exit(1)
-            for i in range(0, len(arg_pair), 2):
-                arg_name = arg_pair[i]
-                arg_value = arg_pair[i + 1]
-                overrides[arg_name] = arg_value.strip('"')
+    # --overrides can be passed several times, so flatten all of them into one
+    # list of name/value pairs.
+    override_args : List[str] = [arg for args_list in args.overrides or [] for arg in args_list]
+    if len(override_args) % 2 != 0:
+        parser.error("Invalid named arguments. Each argument should have a corresponding value.")
+    override_iter = iter(override_args)
+    overrides : OverridesDict = {arg_name: arg_value.strip('"') for arg_name, arg_value in zip(override_iter, override_iter)}
 
     # Read the contents of the prompt file
     with open(prompt_file, 'r') as file:
@@ -475,7 +678,9 @@ def main() -> None:
                 # split and trim the placeholders
                 ignore[key] = [p.strip() for p in parts[1].split(',')]
 
-    context = ExecutionContext(overrides, timestamp, ignore)
+    os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+
+    context = ExecutionContext(overrides, timestamp, ignore, args.parallel, not args.no_llm_cache)
 
     execute_prompt(prompt_base_filename, prompt_contents, context)
 